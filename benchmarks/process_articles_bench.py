@@ -0,0 +1,89 @@
+"""Microbenchmark for NewsAPI_Fetcher.process_articles on pages of 100 articles.
+
+Compares the current precompiled, single-pass normalization against the
+previous per-article re.sub + dict rebuild. Run from the ComfyUI custom_nodes
+directory (or anywhere the plugin package is importable):
+
+    python -m FirstPlugin.benchmarks.process_articles_bench
+"""
+import random
+import re
+import timeit
+
+from ..FirstPlugin import NewsAPI_Fetcher
+
+PAGE_SIZE = 100
+PAGES = 50
+MAX_CONTENT_LENGTH = 500
+
+
+def legacy_process_content(content, max_length):
+    if content == "No content" or not content:
+        return "No content"
+    content = re.sub(r'\s*\[\s*\+?\d+\s*(?:chars?|characteres?)?\s*\]\s*$', '', content)
+    if max_length > 0 and len(content) > max_length:
+        last_space = content.rfind(' ', 0, max_length)
+        if last_space != -1 and last_space > max_length * 0.9:
+            return content[:last_space].strip() + "..."
+        return content[:max_length].strip() + "..."
+    return content.strip()
+
+
+def legacy_process_articles(articles, max_content_length):
+    processed = []
+    for article in articles:
+        if not article.get("url"):
+            continue
+        content = legacy_process_content(article.get("content", "No content"), max_content_length)
+        processed.append({
+            "source": article.get("source", {}).get("name", "Unknown source"),
+            "author": article.get("author", "Unknown author"),
+            "title": article.get("title", "No title"),
+            "description": article.get("description", "No description"),
+            "content": content,
+            "url": article.get("url", ""),
+            "urlToImage": article.get("urlToImage", ""),
+            "publishedAt": article.get("publishedAt", "")
+        })
+    return processed
+
+
+def make_page(page, rng):
+    words = ["market", "election", "storm", "league", "study", "court", "launch", "energy", "city", "report"]
+    articles = []
+    for i in range(PAGE_SIZE):
+        body = " ".join(rng.choice(words) for _ in range(rng.randint(20, 160)))
+        articles.append({
+            "source": {"id": None, "name": f"Source {i % 7}"},
+            "author": f"Author {i}",
+            "title": f"Headline {page}-{i}",
+            "description": body[:120],
+            "content": f"{body} [+{rng.randint(100, 9000)} chars]",
+            "url": f"https://example.com/{page}/{i}",
+            "urlToImage": f"https://example.com/{page}/{i}.jpg",
+            "publishedAt": "2024-01-01T00:00:00Z"
+        })
+    return articles
+
+
+def main():
+    rng = random.Random(0)
+    pages = [make_page(p, rng) for p in range(PAGES)]
+    fetcher = NewsAPI_Fetcher()
+
+    def run_legacy():
+        for page in pages:
+            legacy_process_articles(page, MAX_CONTENT_LENGTH)
+
+    def run_current():
+        for page in pages:
+            fetcher.process_articles(page, MAX_CONTENT_LENGTH)
+
+    articles = PAGE_SIZE * PAGES
+    for name, func in (("legacy", run_legacy), ("current", run_current)):
+        best = min(timeit.repeat(func, number=5, repeat=5)) / 5
+        print(f"{name:8s} {best / articles * 1e6:.2f} us/article")
+
+
+if __name__ == "__main__":
+    main()